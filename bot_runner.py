@@ -1,42 +1,165 @@
 import asyncio
 import logging
+import logging.handlers
+import queue
+import signal
+import time
 from config import CONFIG
 from state_manager import StateManager
-from oanda_client import OandaClient
+from oanda_client import GRANULARITY_SECONDS, OandaClient
 from trading_bot import TradingBot
 from telegram_interface import TelegramBot
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 logger = logging.getLogger(__name__)
 
-async def main():
-    state = StateManager()
-    client = OandaClient(CONFIG.OANDA_API_KEY, CONFIG.OANDA_ACCOUNT_ID)
-    await client.init_session()
 
-    trading_bot = TradingBot(state.state, client)
-    telegram_bot = TelegramBot(CONFIG.TELEGRAM_BOT_TOKEN, CONFIG.TELEGRAM_CHAT_ID, trading_bot)
+class BotRunner:
+    def __init__(self):
+        self.state_manager = StateManager()
+        self.state = self.state_manager.state
+        self.session = None
+        self.client = None
+        self.trading_bot = None
+        self.telegram_bot = None
+        self.tasks = []
+        self._shutdown = asyncio.Event()
+        self._stopped = False
+        self._new_bar = asyncio.Event()
+
+    async def __aenter__(self):
+        # One pooled session for every OANDA call, including the pricing stream.
+        self.session = OandaClient.new_session(CONFIG.OANDA_API_KEY)
+        try:
+            self.client = OandaClient(
+                CONFIG.OANDA_API_KEY, CONFIG.OANDA_ACCOUNT_ID, session=self.session
+            )
+            self.trading_bot = TradingBot(self.state, self.client)
+            self.telegram_bot = TelegramBot(
+                CONFIG.TELEGRAM_BOT_TOKEN, CONFIG.TELEGRAM_CHAT_ID, self.trading_bot
+            )
+        except Exception:
+            # __aexit__ does not run when __aenter__ raises.
+            await self.session.close()
+            raise
+        return self
 
-    await trading_bot.start()
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+        await self.session.close()
 
-    # Start telegram bot polling in background
-    telegram_task = asyncio.create_task(telegram_bot.run())
+    def _install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self._shutdown.set)
+            except NotImplementedError:
+                logger.debug("Signal handler for %r not supported on this platform.", sig)
 
-    try:
+    async def _run_trading_bot(self):
+        # Run once on startup, then once per new bar. The timeout keeps open
+        # trades monitored if the stream stalls or the market is quiet.
+        self._new_bar.set()
+        while True:
+            try:
+                await asyncio.wait_for(self._new_bar.wait(), timeout=CONFIG.MAX_CYCLE_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._new_bar.clear()
+            # One failed cycle (e.g. OANDA down past its retries) must not
+            # end the loop; log it and try again on the next bar.
+            try:
+                await self.trading_bot.trade_cycle()
+            except Exception:
+                logger.exception("Trade cycle failed.")
+            self.state_manager.mark_dirty()
+
+    async def _stream_consumer(self):
+        bar_seconds = GRANULARITY_SECONDS.get(CONFIG.CANDLE_GRANULARITY, 60)
+        # The next bar boundary is derived once per bar, so each tick is a
+        # single clock read and comparison.
+        next_bar_at = (int(time.time()) // bar_seconds + 1) * bar_seconds
         while True:
-            await trading_bot.trade_cycle()
+            try:
+                async for _price in self.client.stream_prices(CONFIG.INSTRUMENT):
+                    now = time.time()
+                    if now >= next_bar_at:
+                        next_bar_at = (int(now) // bar_seconds + 1) * bar_seconds
+                        self._new_bar.set()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Pricing stream error: %s", e)
             await asyncio.sleep(CONFIG.COOLDOWN_SECONDS)
-    except KeyboardInterrupt:
-        logger.info("KeyboardInterrupt received, shutting down.")
-    finally:
-        await trading_bot.stop()
-        await client.close()
-        telegram_task.cancel()
+
+    async def start(self):
+        self._install_signal_handlers()
+        await self.trading_bot.start()
+
+        self.tasks = [
+            asyncio.create_task(self._run_trading_bot()),
+            asyncio.create_task(self._stream_consumer()),
+            asyncio.create_task(self.telegram_bot.run()),
+            asyncio.create_task(self.state_manager.run_flusher()),
+        ]
         try:
-            await telegram_task
-        except asyncio.CancelledError:
-            pass
+            await self._shutdown.wait()
+            logger.info("Shutdown signal received, stopping.")
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        if self._stopped:
+            return
+        self._stopped = True
+
+        await self.trading_bot.stop()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        await self.state_manager.flush()
+        self.state_manager.close()
+        await self.client.close()
+
+
+def setup_logging(level=CONFIG.LOGGING_LEVEL, logfile="trading_bot.log"):
+    """Route all records through a queue so handler I/O happens off the event loop.
+
+    Returns the started QueueListener; stop it on exit to drain pending records.
+    """
+    formatter = logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    stream_handler = logging.StreamHandler()
+    file_handler = logging.FileHandler(logfile)
+    for handler in (stream_handler, file_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, file_handler)
+    listener.start()
+    return listener
+
+
+async def main():
+    async with BotRunner() as runner:
+        await runner.start()
+
 
 if __name__ == "__main__":
-    logging.basicConfig(level=CONFIG.LOGGING_LEVEL)
-    asyncio.run(main())
- 
\ No newline at end of file
+    listener = setup_logging()
+    try:
+        if uvloop is not None:
+            # uvloop.run builds its own loop instead of swapping the global
+            # policy, which uvloop.install() does and newer uvloop deprecates.
+            uvloop.run(main())
+        else:
+            asyncio.run(main())
+    finally:
+        listener.stop()
@@ -0,0 +1,55 @@
+from dataclasses import dataclass
+from operator import itemgetter
+import numpy as np
+
+_MID_OHLC = itemgetter("o", "h", "l", "c")
+
+
+@dataclass(slots=True)
+class CandleBuffer:
+    """Column-oriented candle data parsed once from an OANDA candles payload."""
+
+    times: np.ndarray
+    opens: np.ndarray
+    highs: np.ndarray
+    lows: np.ndarray
+    closes: np.ndarray
+    volumes: np.ndarray
+    complete: np.ndarray
+
+    def __len__(self):
+        return len(self.closes)
+
+    @classmethod
+    def from_candles(cls, candles):
+        """Parse OANDA mid candles or flat OHLC dicts; all must share one layout."""
+        n = len(candles)
+        mid = n > 0 and "mid" in candles[0]
+        if any(("mid" in c) != mid for c in candles):
+            raise ValueError("Candles mix the mid and flat OHLC layouts.")
+        if mid:
+            values = (float(v) for c in candles for v in _MID_OHLC(c["mid"]))
+        else:
+            values = (
+                float(v)
+                for c in candles
+                for v in (c.get("open", c["close"]), c.get("high", c["close"]),
+                          c.get("low", c["close"]), c["close"])
+            )
+        # Parse row-major in one pass, then transpose into contiguous columns.
+        ohlc = np.fromiter(values, dtype=np.float64, count=4 * n).reshape(n, 4).T.copy()
+        times = np.array([c.get("time", "") for c in candles], dtype=object)
+        volumes = np.fromiter((c.get("volume", 0) for c in candles), dtype=np.int64, count=n)
+        complete = np.fromiter((c.get("complete", True) for c in candles), dtype=bool, count=n)
+        return cls(times, ohlc[0], ohlc[1], ohlc[2], ohlc[3], volumes, complete)
+
+    @classmethod
+    def from_response(cls, response):
+        candles = response.get("candles", []) if isinstance(response, dict) else []
+        return cls.from_candles(candles)
+
+    def select(self, mask):
+        return CandleBuffer(
+            self.times[mask], self.opens[mask], self.highs[mask], self.lows[mask],
+            self.closes[mask], self.volumes[mask], self.complete[mask],
+        )
@@ -1,21 +1,41 @@
 import os
+from dataclasses import dataclass
 
 
-class CONFIG:
-    OANDA_API_KEY = os.getenv("OANDA_API_KEY")
-    OANDA_ACCOUNT_ID = os.getenv("OANDA_ACCOUNT_ID")
-    TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-    TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+@dataclass(frozen=True, slots=True)
+class Config:
+    OANDA_API_KEY: str | None = os.getenv("OANDA_API_KEY")
+    OANDA_ACCOUNT_ID: str | None = os.getenv("OANDA_ACCOUNT_ID")
+    TELEGRAM_BOT_TOKEN: str | None = os.getenv("TELEGRAM_BOT_TOKEN")
+    TELEGRAM_CHAT_ID: str | None = os.getenv("TELEGRAM_CHAT_ID")
+    # Seconds getUpdates may hold the connection open waiting for updates.
+    TELEGRAM_POLL_TIMEOUT: int = 30
+    # Repeats of /maketrade from one chat within this window are ignored.
+    TELEGRAM_DEBOUNCE_SECONDS: float = 1
 
-    INSTRUMENT = "EUR_USD"
-    CANDLE_GRANULARITY = "M5"
-    CANDLE_COUNT = 50
+    INSTRUMENT: str = "EUR_USD"
+    CANDLE_GRANULARITY: str = "M5"
+    CANDLE_COUNT: int = 50
+    CANDLE_CACHE_SECONDS: float = 5
+    PRICE_CACHE_SECONDS: float = 1
+    ACCOUNT_CACHE_SECONDS: float = 0.25
+    REQUEST_TIMEOUT_SECONDS: float = 10
+    REQUEST_RETRIES: int = 3
+    MAX_CONCURRENT_REQUESTS: int = 5
+    MAX_REQUESTS_PER_SECOND: float = 100
 
-    DEFAULT_UNITS = 1000
-    COOLDOWN_SECONDS = 6
+    DEFAULT_UNITS: int = 1000
+    COOLDOWN_SECONDS: float = 6
+    MAX_CYCLE_INTERVAL: float = 60
+    STATE_FLUSH_SECONDS: float = 6
 
-    RSI_OVERSOLD = 30
-    RSI_OVERBOUGHT = 70
+    # ATR floor, in pips, when candles are flat or missing.
+    MIN_ATR_PIPS: float = 5
 
-    LOGGING_LEVEL = "INFO"
- 
\ No newline at end of file
+    RSI_OVERSOLD: float = 30
+    RSI_OVERBOUGHT: float = 70
+
+    LOGGING_LEVEL: str = "INFO"
+
+
+CONFIG = Config()
@@ -1,42 +1,114 @@
+import asyncio
 import logging
+import numpy as np
+from config import CONFIG
+from utils import candle_closes
+
+try:
+    import bottleneck as bn
+except ImportError:
+    bn = None
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_INSTRUMENTS = (
+    "EUR_USD",
+    "USD_JPY",
+    "GBP_USD",
+    "USD_CHF",
+    "AUD_USD",
+    "USD_CAD",
+    "NZD_USD",
+)
+
 
 class InstrumentSelector:
-    def __init__(self, instruments=None):
-        self.instruments = instruments or [
-            "EUR_USD",
-            "USD_JPY",
-            "GBP_USD",
-            "USD_CHF",
-            "AUD_USD",
-            "USD_CAD",
-            "NZD_USD",
-        ]
-
-    def get_best_instrument(self, market_data):
+    def __init__(self, instruments=None, client=None):
+        self.client = client
+        self.instruments = tuple(instruments) if instruments else DEFAULT_INSTRUMENTS
+
+    async def fetch_market_data(self, granularity=CONFIG.CANDLE_GRANULARITY, count=CONFIG.CANDLE_COUNT):
+        """Fetch candles for every instrument concurrently, at most
+        CONFIG.MAX_CONCURRENT_REQUESTS in flight to stay inside OANDA's rate limit."""
+        semaphore = asyncio.Semaphore(CONFIG.MAX_CONCURRENT_REQUESTS)
+
+        async def fetch(instrument):
+            async with semaphore:
+                return await self.client.get_candles(instrument, granularity, count)
+
+        responses = await asyncio.gather(
+            *(fetch(instrument) for instrument in self.instruments),
+            return_exceptions=True,
+        )
+        market_data = {}
+        for instrument, response in zip(self.instruments, responses):
+            if isinstance(response, Exception):
+                logger.error("Failed to fetch candles for %s: %s", instrument, response)
+                continue
+            market_data[instrument] = response.get("candles", []) if isinstance(response, dict) else []
+        return market_data
+
+    async def snapshot_prices(self):
+        """Mid prices for every instrument from a single /pricing request."""
+        return await self.client.get_mid_prices(self.instruments)
+
+    async def get_best_instrument(self, market_data=None):
+        if market_data is None and self.client is not None:
+            market_data = await self.fetch_market_data()
+
         if not market_data:
             logger.warning("No market data for instrument selection.")
             return self.instruments[0]
 
-        volatilities = {}
-        for instrument in self.instruments:
-            data = market_data.get(instrument)
-            if data:
-                volatilities[instrument] = self.calculate_volatility(data)
-            else:
-                volatilities[instrument] = 0
-
-        best = max(volatilities, key=volatilities.get)
-        logger.info(f"Selected instrument {best} with volatility {volatilities[best]:.5f}")
+        volatilities = self.calculate_volatilities(
+            [self._closes(market_data.get(instrument)) for instrument in self.instruments]
+        )
+        best_idx = int(np.argmax(volatilities))
+        best = self.instruments[best_idx]
+        logger.info("Selected instrument %s with volatility %.5f", best, volatilities[best_idx])
         return best
 
     def calculate_volatility(self, candles):
-        closes = [candle["close"] for candle in candles]
+        return self._std(self._closes(candles))
+
+    @staticmethod
+    def calculate_volatilities(closes):
+        """Sample std of every close series in one pass over an (N, T) matrix.
+
+        Series are right-aligned and NaN-padded to the longest one, so
+        instruments with short or missing history still share the reduction.
+        Rows with fewer than two closes get zero volatility.
+        """
+        width = max((len(c) for c in closes), default=0)
+        matrix = np.full((len(closes), width), np.nan)
+        for row, series in enumerate(closes):
+            if len(series):
+                matrix[row, width - len(series):] = series
+
+        valid = ~np.isnan(matrix)
+        counts = valid.sum(axis=1)
+        if bn is not None:
+            # bottleneck's NaN-skipping reduction is a single C loop per row.
+            with np.errstate(invalid="ignore", divide="ignore"):
+                stds = bn.nanstd(matrix, axis=1, ddof=1)
+            return np.where(counts >= 2, stds, 0.0)
+        filled = np.where(valid, matrix, 0.0)
+        means = filled.sum(axis=1) / np.maximum(counts, 1)
+        # Centre the zero-filled matrix once and re-mask it in place; the row
+        # sums of squares then come from einsum without a squared temporary.
+        deviations = filled - means[:, None]
+        deviations *= valid
+        squared = np.einsum("ij,ij->i", deviations, deviations)
+        return np.where(counts >= 2, np.sqrt(squared / np.maximum(counts - 1, 1)), 0.0)
+
+    @staticmethod
+    def _closes(candles):
+        if not candles:
+            return np.empty(0, dtype=np.float64)
+        return candle_closes(candles)
+
+    @staticmethod
+    def _std(closes):
         if len(closes) < 2:
-            return 0
-        mean = sum(closes) / len(closes)
-        variance = sum((x - mean) ** 2 for x in closes) / (len(closes) - 1)
-        return variance ** 0.5
- 
\ No newline at end of file
+            return 0.0
+        return float(closes.std(ddof=1))
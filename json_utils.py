@@ -0,0 +1,41 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    logger.debug("orjson not installed; JSON goes through the stdlib json module.")
+
+if orjson is not None:
+    JSONDecodeError = orjson.JSONDecodeError
+    # Indicator values can arrive as numpy scalars and ids as ints; the
+    # stdlib json accepts both, so orjson is told to as well.
+    _OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj, pretty=False):
+        return orjson.dumps(obj, option=_OPTIONS | orjson.OPT_INDENT_2 if pretty else _OPTIONS)
+
+    loads = orjson.loads
+else:
+    JSONDecodeError = json.JSONDecodeError
+
+    def _default(obj):
+        if hasattr(obj, "tolist"):
+            return obj.tolist()
+        if hasattr(obj, "isoformat"):
+            return obj.isoformat()
+        raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+    def dumps(obj, pretty=False):
+        # UTF-8 rather than \u escapes, like orjson. NaN and Infinity still
+        # come out as the non-standard literals orjson would write as null.
+        if pretty:
+            return json.dumps(obj, default=_default, ensure_ascii=False, indent=2).encode()
+        return json.dumps(
+            obj, default=_default, ensure_ascii=False, separators=(",", ":")
+        ).encode()
+
+    loads = json.loads
@@ -1,80 +1,342 @@
 import aiohttp
+import asyncio
 import logging
+import json_utils
+import random
+import time
+from collections import OrderedDict
+from candles import CandleBuffer
+from config import CONFIG
 
 logger = logging.getLogger(__name__)
 
+GRANULARITY_SECONDS = {
+    "S5": 5, "S10": 10, "S15": 15, "S30": 30,
+    "M1": 60, "M2": 120, "M4": 240, "M5": 300, "M10": 600, "M15": 900, "M30": 1800,
+    "H1": 3600, "H2": 7200, "H3": 10800, "H4": 14400, "H6": 21600, "H8": 28800,
+    "H12": 43200, "D": 86400,
+}
+
+# Only instrument and units vary per market order, so the body is filled into
+# a pre-encoded template rather than built as a dict and serialized.
+_MARKET_ORDER_TEMPLATE = (
+    b'{"order":{"instrument":"%b","units":"%d","type":"MARKET","positionFill":"DEFAULT"}}'
+)
+
+
+class _TokenBucket:
+    """Rate limiter holding up to `rate` tokens, refilled continuously at `rate` per second."""
+
+    __slots__ = ("rate", "tokens", "updated", "_lock")
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                # Holding the lock while sleeping keeps waiters in FIFO order.
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
 
 class OandaClient:
     BASE_URL = "https://api-fxpractice.oanda.com/v3"
+    STREAM_URL = "https://stream-fxpractice.oanda.com/v3"
+    CANDLE_CACHE_SIZE = 64
+    PRICE_CACHE_SIZE = 256
+    # aiohttp drops idle sockets after 15s by default, well inside the gap
+    # between trade cycles; keep them for as long as OANDA's side does.
+    KEEPALIVE_SECONDS = 60
+    RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+    IDEMPOTENT_METHODS = frozenset({"GET", "PUT"})
 
-    def __init__(self, api_key, account_id):
-        self.api_key = api_key
-        self.account_id = account_id
-        self.session = None
-        self.headers = {
-            "Authorization": f"Bearer {self.api_key}",
+    def __init__(self, api_key=None, account_id=None, session=None):
+        self.api_key = api_key or CONFIG.OANDA_API_KEY
+        self.account_id = account_id or CONFIG.OANDA_ACCOUNT_ID
+        # A session passed in is shared with other components and owned by the caller.
+        self.session = session
+        self._owns_session = session is None
+        self.timeout = aiohttp.ClientTimeout(total=CONFIG.REQUEST_TIMEOUT_SECONDS)
+        self._candle_cache = OrderedDict()
+        self._price_cache = OrderedDict()
+        self._mid_cache = OrderedDict()
+        self._summary_cache = (0.0, None)
+        self._inflight = {}
+        self._bucket = _TokenBucket(CONFIG.MAX_REQUESTS_PER_SECOND)
+        # URLs are fixed for the client's lifetime; build them once.
+        account_url = f"{self.BASE_URL}/accounts/{self.account_id}"
+        self._candles_url = f"{self.BASE_URL}/instruments/{{}}/candles"
+        self._pricing_url = f"{account_url}/pricing"
+        self._stream_url = f"{self.STREAM_URL}/accounts/{self.account_id}/pricing/stream"
+        self._orders_url = f"{account_url}/orders"
+        self._open_trades_url = f"{account_url}/openTrades"
+        self._close_trade_url = f"{account_url}/trades/{{}}/close"
+        self._summary_url = f"{account_url}/summary"
+        self.headers = self.auth_headers(self.api_key)
+        # Sessions from new_session() already send these; only a foreign
+        # session needs them attached to every request.
+        self._request_headers = None if session is None else self._missing_headers(session)
+
+    @staticmethod
+    def auth_headers(api_key):
+        return {
+            "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json",
         }
 
+    @classmethod
+    def new_session(cls, api_key=None):
+        """The pooled session every OANDA request should go through.
+
+        Create it once per process (or pass one in) and reuse it: each new
+        session pays fresh TCP and TLS handshakes against OANDA. The auth
+        headers live on the session, so requests do not carry their own.
+        """
+        connector = aiohttp.TCPConnector(
+            limit=40,
+            limit_per_host=30,
+            ttl_dns_cache=300,
+            keepalive_timeout=cls.KEEPALIVE_SECONDS,
+            enable_cleanup_closed=True,
+        )
+        headers = cls.auth_headers(api_key or CONFIG.OANDA_API_KEY)
+        return aiohttp.ClientSession(connector=connector, headers=headers)
+
+    def _missing_headers(self, session):
+        if all(session.headers.get(k) == v for k, v in self.headers.items()):
+            return None
+        return self.headers
+
     async def init_session(self):
         if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession(headers=self.headers)
+            self.session = self.new_session(self.api_key)
+            self._request_headers = None
+            self._owns_session = True
             logger.info("✅ OandaClient HTTP session initialized.")
 
     async def close(self):
-        if self.session and not self.session.closed:
+        if self._owns_session and self.session and not self.session.closed:
             await self.session.close()
             logger.info("🛑 OandaClient HTTP session closed.")
             self.session = None
 
-    async def _request(self, method, endpoint, **kwargs):
+    async def __aenter__(self):
+        await self.init_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _request(self, method, url, **kwargs):
         if not self.session or self.session.closed:
             await self.init_session()
 
-        url = f"{self.BASE_URL}{endpoint}"
-        try:
-            async with self.session.request(method, url, **kwargs) as response:
-                response.raise_for_status()
-                data = await response.json()
-                return data
-        except aiohttp.ClientResponseError as e:
-            logger.error(f"OANDA API error {e.status}: {e.message}")
-            raise
-        except Exception as e:
-            logger.error(f"OANDA request error: {e}")
-            raise
-
-    async def get_candles(self, instrument, granularity="M1", count=100):
-        endpoint = f"/instruments/{instrument}/candles"
-        params = {"granularity": granularity, "count": count, "price": "M"}
-        return await self._request("GET", endpoint, params=params)
+        kwargs.setdefault("timeout", self.timeout)
+        if "json" in kwargs:
+            # Encode request bodies with json_utils too; Content-Type is already set in headers.
+            kwargs["data"] = json_utils.dumps(kwargs.pop("json"))
+        attempt = 0
+        while True:
+            await self._bucket.acquire()
+            try:
+                async with self.session.request(method, url, headers=self._request_headers, **kwargs) as response:
+                    response.raise_for_status()
+                    return json_utils.loads(await response.read())
+            except aiohttp.ClientResponseError as e:
+                if attempt < CONFIG.REQUEST_RETRIES and self._retryable(method, e.status):
+                    attempt = await self._backoff(attempt, method, url, e.status)
+                    continue
+                logger.error("OANDA API error %s: %s", e.status, e.message)
+                raise
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt < CONFIG.REQUEST_RETRIES and method in self.IDEMPOTENT_METHODS:
+                    attempt = await self._backoff(attempt, method, url, e)
+                    continue
+                logger.error("OANDA request error: %s", e)
+                raise
+            except Exception as e:
+                logger.error("OANDA request error: %s", e)
+                raise
+
+    def _retryable(self, method, status):
+        # A 429 was never acted on, so any method may retry it; 5xx and
+        # timeouts may have been, so only requests that are safe to repeat do
+        # (a retried POST could open a second position).
+        if status == 429:
+            return True
+        return status in self.RETRY_STATUSES and method in self.IDEMPOTENT_METHODS
+
+    async def _backoff(self, attempt, method, url, reason):
+        # Exponential backoff jittered by ±50%, so concurrent callers
+        # that failed together do not retry together.
+        delay = min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random())
+        logger.warning(
+            "OANDA %s %s failed (%s); retry %d in %.2fs", method, url, reason, attempt + 1, delay
+        )
+        await asyncio.sleep(delay)
+        return attempt + 1
+
+    async def _singleflight(self, key, fetch):
+        """Run fetch() once for concurrent callers of the same key.
+
+        Callers that arrive while a fetch for `key` is in flight await that
+        fetch instead of issuing their own request. The shared task is
+        shielded, so one caller being cancelled does not fail the others.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def get_candles(self, instrument, granularity="M1", count=100, from_time=None):
+        entry = await self._candle_entry(instrument, granularity, count, from_time)
+        return entry[1]
+
+    async def get_candle_buffer(self, instrument, granularity="M1", count=100, from_time=None):
+        """Parsed candles, shared by every caller while the response is cached; treat as read-only."""
+        entry = await self._candle_entry(instrument, granularity, count, from_time)
+        if entry[2] is None:
+            entry[2] = CandleBuffer.from_response(entry[1])
+        return entry[2]
+
+    async def _candle_entry(self, instrument, granularity, count, from_time):
+        # Entries live until the bar closes or CANDLE_CACHE_SECONDS pass, so
+        # repeat fetches within one trade cycle share a single request and,
+        # through get_candle_buffer, a single parse.
+        bar_seconds = GRANULARITY_SECONDS.get(granularity, 60)
+        now = time.time()
+        bar_start = int(now) // bar_seconds * bar_seconds
+        key = (instrument, granularity, count, from_time, bar_start)
+        cached = self._candle_cache.get(key)
+        if cached is not None and cached[0] > now:
+            self._candle_cache.move_to_end(key)
+            return cached
+
+        async def fetch():
+            params = {"granularity": granularity, "count": count, "price": "M"}
+            if from_time:
+                params["from"] = from_time
+            url = self._candles_url.format(instrument)
+            data = await self._request("GET", url, params=params)
+            # [expires_at, raw response, parsed CandleBuffer or None until first asked for]
+            entry = [min(bar_start + bar_seconds, now + CONFIG.CANDLE_CACHE_SECONDS), data, None]
+            self._candle_cache[key] = entry
+            # Refilling an expired key keeps its old slot; mark it fresh.
+            self._candle_cache.move_to_end(key)
+            if len(self._candle_cache) > self.CANDLE_CACHE_SIZE:
+                self._candle_cache.popitem(last=False)
+            return entry
+
+        return await self._singleflight(("candles", key), fetch)
 
     async def get_prices(self, instruments):
-        endpoint = f"/accounts/{self.account_id}/pricing"
-        params = {"instruments": instruments}
-        return await self._request("GET", endpoint, params=params)
+        # Prices are relative-time data, so entries expire on the monotonic
+        # clock rather than on any wall-clock bucket.
+        now = time.monotonic()
+        cached = self._price_cache.get(instruments)
+        if cached is not None and cached[0] > now:
+            self._price_cache.move_to_end(instruments)
+            return cached[1]
+
+        async def fetch():
+            params = {"instruments": instruments}
+            data = await self._request("GET", self._pricing_url, params=params)
+            self._price_cache[instruments] = (now + CONFIG.PRICE_CACHE_SECONDS, data)
+            self._price_cache.move_to_end(instruments)
+            if len(self._price_cache) > self.PRICE_CACHE_SIZE:
+                self._price_cache.popitem(last=False)
+            return data
+
+        return await self._singleflight(("pricing", instruments), fetch)
+
+    async def get_mid_prices(self, instruments):
+        """Mid price per instrument, fetching every stale one in a single /pricing request."""
+        now = time.monotonic()
+        prices = {}
+        missing = []
+        for instrument in instruments:
+            cached = self._mid_cache.get(instrument)
+            if cached is not None and cached[0] > now:
+                self._mid_cache.move_to_end(instrument)
+                prices[instrument] = cached[1]
+            else:
+                missing.append(instrument)
+        if not missing:
+            return prices
+
+        response = await self.get_prices(",".join(missing))
+        expires_at = now + CONFIG.PRICE_CACHE_SECONDS
+        mid_cache = self._mid_cache
+        for price in response.get("prices", ()):
+            # One lookup per field on the happy path; malformed quotes are skipped.
+            try:
+                instrument = price["instrument"]
+                mid = (float(price["bids"][0]["price"]) + float(price["asks"][0]["price"])) / 2
+            except (KeyError, IndexError, ValueError):
+                continue
+            mid_cache[instrument] = (expires_at, mid)
+            mid_cache.move_to_end(instrument)
+            prices[instrument] = mid
+        while len(self._mid_cache) > self.PRICE_CACHE_SIZE:
+            self._mid_cache.popitem(last=False)
+        return prices
+
+    async def stream_prices(self, instruments):
+        """Yield PRICE messages from the pricing stream; heartbeats are skipped."""
+        if not self.session or self.session.closed:
+            await self.init_session()
+
+        # OANDA sends a heartbeat every 5s, so a long read gap means a dead stream.
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=30)
+        async with self.session.get(
+            self._stream_url,
+            params={"instruments": instruments},
+            headers=self._request_headers,
+            timeout=timeout,
+        ) as response:
+            response.raise_for_status()
+            async for line in response.content:
+                line = line.strip()
+                if not line:
+                    continue
+                message = json_utils.loads(line)
+                if message.get("type") == "PRICE":
+                    yield message
 
     async def create_market_order(self, side, units, instrument):
-        endpoint = f"/accounts/{self.account_id}/orders"
-        order_data = {
-            "order": {
-                "instrument": instrument,
-                "units": str(units if side == "BUY" else -units),
-                "type": "MARKET",
-                "positionFill": "DEFAULT",
-            }
-        }
-        return await self._request("POST", endpoint, json=order_data)
+        signed_units = units if side == "BUY" else -units
+        body = _MARKET_ORDER_TEMPLATE % (instrument.encode(), signed_units)
+        return await self._request("POST", self._orders_url, data=body)
 
     async def get_open_trades(self):
-        endpoint = f"/accounts/{self.account_id}/openTrades"
-        return await self._request("GET", endpoint)
+        return await self._request("GET", self._open_trades_url)
 
     async def close_trade(self, trade_id):
-        endpoint = f"/accounts/{self.account_id}/trades/{trade_id}/close"
-        return await self._request("PUT", endpoint)
+        return await self._request("PUT", self._close_trade_url.format(trade_id))
 
     async def get_account_summary(self):
-        endpoint = f"/accounts/{self.account_id}/summary"
-        return await self._request("GET", endpoint)
+        # Short-lived, so back-to-back sizing calls share one /summary request
+        # while balances still reflect fills within a fraction of a second.
+        now = time.monotonic()
+        expires_at, data = self._summary_cache
+        if data is not None and expires_at > now:
+            return data
+
+        async def fetch():
+            data = await self._request("GET", self._summary_url)
+            self._summary_cache = (now + CONFIG.ACCOUNT_CACHE_SECONDS, data)
+            return data
+
+        return await self._singleflight(("summary",), fetch)
  
\ No newline at end of file
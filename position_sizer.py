@@ -1,5 +1,6 @@
+import asyncio
 import logging
-from utils import calculate_atr
+from utils import cached_atr, pip_size
 from config import CONFIG
 
 logger = logging.getLogger(__name__)
@@ -16,26 +17,30 @@ class PositionSizer:
             account_data = await self.client.get_account_summary()
             balance = float(account_data.get("account", {}).get("balance", self.account_balance))
             self.account_balance = balance
-            logger.info(f"Updated account balance: {self.account_balance}")
+            logger.info("Updated account balance: %s", self.account_balance)
         except Exception as e:
-            logger.error(f"Failed to update account balance: {e}")
+            logger.error("Failed to update account balance: %s", e)
 
     async def calculate_units(self, instrument, risk_percent=1.0):
         try:
-            candles_response = await self.client.get_candles(
-                instrument, CONFIG.CANDLE_GRANULARITY, 50
+            # Independent requests; run them side by side so sizing costs
+            # one round trip. A failed balance refresh keeps the last value.
+            candles, _ = await asyncio.gather(
+                self.client.get_candle_buffer(
+                    instrument, CONFIG.CANDLE_GRANULARITY, CONFIG.CANDLE_COUNT
+                ),
+                self.update_account_balance(),
             )
-            candles = candles_response.get("candles", []) if isinstance(candles_response, dict) else []
-            if not candles:
+            if not len(candles):
                 logger.warning(
                     "No candle data for ATR calculation. Using default units."
                 )
                 return CONFIG.DEFAULT_UNITS
 
-            atr = calculate_atr(candles, period=14)
+            atr = cached_atr(instrument, candles)
             if atr == 0:
                 logger.warning("ATR calculated as zero, adjusting to minimum risk.")
-                atr = 0.0005
+                atr = CONFIG.MIN_ATR_PIPS * pip_size(instrument)
 
             risk_amount = (risk_percent / 100) * self.account_balance
             units = int(risk_amount / (atr * 100000))
@@ -45,11 +50,12 @@ class PositionSizer:
                 logger.debug("Adjusted units to minimum 1000")
 
             logger.info(
-                f"PositionSizer calculated units: {units} for risk_percent: {risk_percent} and ATR: {atr}"
+                "PositionSizer calculated units: %s for risk_percent: %s and ATR: %s",
+                units, risk_percent, atr,
             )
             return units
 
         except Exception as e:
-            logger.error(f"Error calculating position size: {e}")
+            logger.error("Error calculating position size: %s", e)
             return CONFIG.DEFAULT_UNITS
  
\ No newline at end of file
@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
+import io
 import os
 import re
 import ast
+import json
 import shutil
 import subprocess
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
 # === CONFIG ===
 MAX_LINE_LENGTH = 79
@@ -12,6 +15,14 @@ UNUSED_IMPORTS_TO_REMOVE = ["asyncio"]
 DRY_RUN = False
 MAX_FILE_SIZE = 20 * 1024  # 20 KB
 BACKUP_DIR = ".health_backup"
+SYNTAX_CACHE = os.path.join(BACKUP_DIR, "syntax_cache.json")
+
+WS_COLON_RE = re.compile(r"\s+:")
+TRAILING_WS_RE = re.compile(r"[^\S\n]\n")
+# Top-level module of an import line; matched as a whole token, so
+# "asyncio" does not also catch "asyncio_throttle".
+IMPORT_RE = re.compile(r"\s*(?:import|from)\s+(\w+)")
+UNUSED_IMPORTS = frozenset(UNUSED_IMPORTS_TO_REMOVE)
 
 # === UTILITIES ===
 def should_skip(path):
@@ -20,20 +31,78 @@ def should_skip(path):
         or ".venv" in path
         or "/site-packages/" in path
         or "__pycache__" in path
-        or not path.endswith(".py")
-        or os.path.getsize(path) > MAX_FILE_SIZE
+        or f"/{BACKUP_DIR}/" in path
     )
 
-def backup_file(path):
+def iter_py_files(root):
+    """Yield (path, stamp) for .py files under root, pruning skipped
+    directories up front.
+
+    Each file is stat'ed once; that one stat serves both the size check
+    and the syntax-cache stamp.
+    """
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if not should_skip(entry.path + "/"):
+                    yield from iter_py_files(entry.path)
+            elif entry.name.endswith(".py") and not should_skip(entry.path):
+                st = entry.stat()
+                if st.st_size <= MAX_FILE_SIZE:
+                    yield entry.path, file_stamp(st)
+
+def backup_file(path, replaced=False, stamp=None):
+    """Back up path before it is fixed.
+
+    stamp is the file's scan stamp; a backup with the same stamp already
+    holds this content (copy2 keeps the mtime), so it is left alone.
+    replaced says the fixers are about to swap in a new inode via
+    write_file; then a hard link is a valid backup and costs no data copy.
+    Any other file may still be rewritten in place (black runs afterwards),
+    which would change a linked backup too, so it is copied.
+    """
     backup_path = os.path.join(BACKUP_DIR, os.path.relpath(path))
+    if stamp is not None:
+        try:
+            if file_stamp(os.stat(backup_path)) == stamp:
+                return
+        except FileNotFoundError:
+            pass
     os.makedirs(os.path.dirname(backup_path), exist_ok=True)
+    try:
+        os.unlink(backup_path)
+    except FileNotFoundError:
+        pass
+    if replaced:
+        try:
+            os.link(path, backup_path)
+            return
+        except OSError:
+            pass
     shutil.copy2(path, backup_path)
 
-def fix_line_length(path):
-    lines = open(path, encoding="utf-8").readlines()
+def write_file(path, text):
+    tmp_path = f"{path}.health_tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    shutil.copymode(path, tmp_path)
+    os.replace(tmp_path, path)
+
+def split_lines(text):
+    """Lines of text with their endings, split on "\n" only.
+
+    Matches readlines() on the file. str.splitlines() also breaks on form
+    feeds, \x1c-\x1e, \x85 and \u2028/\u2029, which can sit inside
+    strings and comments, so rebuilding its pieces with "\n" corrupts code.
+    """
+    return io.StringIO(text, newline="\n").readlines()
+
+# Fixers take the file's text and return it fixed, so a file is read once,
+# run through every fixer in memory and written at most once.
+def fix_line_length(text, path):
     fixed = []
     changed = False
-    for line in lines:
+    for line in split_lines(text):
         if len(line.rstrip()) > MAX_LINE_LENGTH:
             split = line.rstrip().rfind(" ", 0, MAX_LINE_LENGTH)
             if split == -1:
@@ -43,78 +112,123 @@ def fix_line_length(path):
             changed = True
         else:
             fixed.append(line)
-    if changed and not DRY_RUN:
-        with open(path, "w", encoding="utf-8") as f:
-            f.writelines(fixed)
+    if changed:
         print(f"[FIX] Line length fixed in {path}")
+        return "".join(fixed)
+    return text
 
-def fix_whitespace_colon(path):
-    original = open(path, encoding="utf-8").read()
-    fixed = re.sub(r"\s+:", ":", original)
-    if fixed != original and not DRY_RUN:
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(fixed)
+def fix_whitespace_colon(text, path):
+    fixed = WS_COLON_RE.sub(":", text)
+    if fixed != text:
         print(f"[FIX] Whitespace before colon in {path}")
+    return fixed
 
-def fix_trailing_whitespace(path):
-    lines = open(path, encoding="utf-8").readlines()
-    fixed = [line.rstrip() + "\n" for line in lines]
-    if lines != fixed and not DRY_RUN:
-        with open(path, "w", encoding="utf-8") as f:
-            f.writelines(fixed)
+def fix_trailing_whitespace(text, path):
+    # Most files are already clean; only rebuild them line by line if a
+    # line ends in whitespace or the final newline is missing.
+    if text.endswith("\n") and not TRAILING_WS_RE.search(text):
+        return text
+    fixed = "".join(line.rstrip() + "\n" for line in split_lines(text))
+    if fixed != text:
         print(f"[FIX] Trailing whitespace removed in {path}")
+    return fixed
 
-def fix_final_newline(path):
-    content = open(path, encoding="utf-8").read()
-    if not content.endswith("\n") and not DRY_RUN:
-        with open(path, "a", encoding="utf-8") as f:
-            f.write("\n")
+def fix_final_newline(text, path):
+    if not text.endswith("\n"):
         print(f"[FIX] Added final newline to {path}")
+        return text + "\n"
+    return text
 
-def remove_unused_imports(path):
-    lines = open(path, encoding="utf-8").readlines()
+def remove_unused_imports(text, path):
     new_lines = []
     changed = False
-    for line in lines:
-        if line.strip().startswith(("import", "from")) and any(mod in line for mod in UNUSED_IMPORTS_TO_REMOVE):
+    for line in split_lines(text):
+        match = IMPORT_RE.match(line)
+        if match and match.group(1) in UNUSED_IMPORTS:
             print(f"[FIX] Removed unused import in {path}: {line.strip()}")
             changed = True
             continue
         new_lines.append(line)
-    if changed and not DRY_RUN:
-        with open(path, "w", encoding="utf-8") as f:
-            f.writelines(new_lines)
+    return "".join(new_lines) if changed else text
 
-def remove_debug_statements(path):
-    lines = open(path, encoding="utf-8").readlines()
+def remove_debug_statements(text, path):
     new_lines = []
     changed = False
-    for line in lines:
+    for line in split_lines(text):
         if "print(" in line or "logger.debug" in line:
             changed = True
             print(f"[FIX] Removed debug/print in {path}: {line.strip()}")
             continue
         new_lines.append(line)
-    if changed and not DRY_RUN:
-        with open(path, "w", encoding="utf-8") as f:
-            f.writelines(new_lines)
+    return "".join(new_lines) if changed else text
+
+FIXERS = (
+    fix_line_length,
+    fix_whitespace_colon,
+    fix_trailing_whitespace,
+    fix_final_newline,
+    remove_unused_imports,
+    remove_debug_statements,
+)
 
-def detect_conflict_markers(path):
-    content = open(path, encoding="utf-8").read()
-    if any(marker in content for marker in ["<<<<<<<", "=======", ">>>>>>>"]):
+def detect_conflict_markers(text, path):
+    if any(marker in text for marker in ["<<<<<<<", "=======", ">>>>>>>"]):
         print(f"[ERROR] Merge conflict marker in {path}")
         return True
     return False
 
-def detect_syntax_errors(path):
+def detect_syntax_errors(text, path):
     try:
-        with open(path, encoding="utf-8") as f:
-            ast.parse(f.read(), filename=path)
+        ast.parse(text, filename=path)
         return False
     except Exception as e:
         print(f"[ERROR] Syntax error in {path}: {e}")
         return True
 
+def file_stamp(st):
+    return [st.st_mtime_ns, st.st_size]
+
+def load_syntax_cache():
+    """Paths that parsed cleanly on a previous run, with their stamps then."""
+    try:
+        with open(SYNTAX_CACHE, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_syntax_cache(cache):
+    # json.dump writes chunk by chunk; encode in memory and write once.
+    data = json.dumps(cache)
+    with open(SYNTAX_CACHE, "w", encoding="utf-8") as f:
+        f.write(data)
+
+def process_file(path, known_good=False, stamp=None):
+    """Back up, check and fix one file.
+
+    Returns (broken, clean): clean is True if the file parsed cleanly and
+    no fixer changed it, so its scan stamp can be cached. Fixed text is
+    not re-parsed here (a removed print can leave an empty block), so a
+    fixed file is parsed again on the next run. known_good skips the AST
+    parse for a file unchanged since it last parsed cleanly; stamp lets
+    backup_file skip a backup that is already current.
+    """
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if detect_conflict_markers(text, path) or (
+        not known_good and detect_syntax_errors(text, path)
+    ):
+        backup_file(path, stamp=stamp)
+        return True, False
+    fixed = text
+    for fixer in FIXERS:
+        fixed = fixer(fixed, path)
+    backup_file(path, replaced=fixed != text and not DRY_RUN, stamp=stamp)
+    if fixed != text:
+        if not DRY_RUN:
+            write_file(path, fixed)
+        return False, False
+    return False, True
+
 def run_command(cmd, name):
     try:
         print(f"[RUN] {' '.join(cmd)}")
@@ -126,28 +240,22 @@ def run_command(cmd, name):
 
 # === MAIN SCAN ===
 def scan_all_py_files():
-    bad_count = 0
-    py_files = []
-
-    for root, _, files in os.walk("."):
-        for f in files:
-            full = os.path.join(root, f)
-            if should_skip(full):
-                continue
-            py_files.append(full)
-
-    for path in py_files:
-        backup_file(path)
-        has_issue = detect_conflict_markers(path) or detect_syntax_errors(path)
-        if has_issue:
-            bad_count += 1
-            continue
-        fix_line_length(path)
-        fix_whitespace_colon(path)
-        fix_trailing_whitespace(path)
-        fix_final_newline(path)
-        remove_unused_imports(path)
-        remove_debug_statements(path)
+    scanned = list(iter_py_files("."))
+    py_files = [path for path, _ in scanned]
+
+    # Files are independent and the work is CPU-bound parsing and regex
+    # substitution, so spread it over all cores.
+    syntax_cache = load_syntax_cache()
+    known_good = [syntax_cache.get(path) == stamp for path, stamp in scanned]
+    with ProcessPoolExecutor() as executor:
+        stamps = [stamp for _, stamp in scanned]
+        results = list(
+            executor.map(process_file, py_files, known_good, stamps, chunksize=8)
+        )
+    bad_count = sum(broken for broken, _ in results)
+    save_syntax_cache(
+        {path: stamp for (path, stamp), (_, clean) in zip(scanned, results) if clean}
+    )
 
     if bad_count / max(1, len(py_files)) > 0.25:
         print("[ABORT] Too many broken files. Halting.")
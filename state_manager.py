@@ -1,38 +1,167 @@
-import json
-import threading
+import asyncio
+import os
 import logging
+from contextlib import asynccontextmanager
+import json_utils
+from config import CONFIG
 
 logger = logging.getLogger(__name__)
 
 
+class AsyncReadWriteLock:
+    """Many concurrent readers or one writer; waiting writers block new readers."""
+
+    def __init__(self):
+        self._cond = asyncio.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @asynccontextmanager
+    async def read(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: not self._writer and not self._writers_waiting)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @asynccontextmanager
+    async def write(self):
+        async with self._cond:
+            self._writers_waiting += 1
+            try:
+                await self._cond.wait_for(lambda: not self._writer and not self._readers)
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
 class StateManager:
-    def __init__(self, filepath="trade_state.json"):
+    # set() appends to a journal next to the snapshot; once it holds this many
+    # entries the next flush folds it back into a fresh snapshot.
+    COMPACT_AFTER = 500
+
+    def __init__(self, filepath="trade_state.json", flush_interval=CONFIG.STATE_FLUSH_SECONDS):
         self.filepath = filepath
-        self.lock = threading.Lock()
-        self.state = self.load_state()
+        self.journal_path = f"{filepath}.log"
+        self.flush_interval = flush_interval
+        self._journal_entries = 0
+        self._journal = None
+        self._snapshot = None
+        self._rw = AsyncReadWriteLock()
+        self._dirty = False
+        self._dirty_event = asyncio.Event()
+        self.state = self._load_state()
 
-    def load_state(self):
+    def _load_state(self):
         try:
-            with open(self.filepath, "r") as f:
-                state = json.load(f)
-                logger.info("State loaded from file.")
-                return state
-        except (FileNotFoundError, json.JSONDecodeError):
+            with open(self.filepath, "rb") as f:
+                data = f.read()
+            state = json_utils.loads(data)
+            self._snapshot = data
+            logger.info("State loaded from file.")
+        except (FileNotFoundError, json_utils.JSONDecodeError):
             logger.warning("State file missing or corrupt; starting fresh.")
-            return {"open_trades": {}}
+            state = {"open_trades": {}}
+        self._replay_journal(state)
+        return state
 
-    def save_state(self):
+    def _replay_journal(self, state):
         try:
-            with self.lock:
-                with open(self.filepath, "w") as f:
-                    json.dump(self.state, f, indent=4)
-        except Exception as e:
-            logger.error(f"Failed to save state: {e}")
-
-    def get(self, key, default=None):
-        return self.state.get(key, default)
-
-    def set(self, key, value):
-        self.state[key] = value
-        self.save_state()
- 
\ No newline at end of file
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    try:
+                        entry = json_utils.loads(line)
+                    except json_utils.JSONDecodeError:
+                        logger.warning("Truncated state journal entry; ignoring the rest.")
+                        break
+                    state[entry["k"]] = entry["v"]
+                    self._journal_entries += 1
+        except FileNotFoundError:
+            return
+        if self._journal_entries:
+            logger.info("Replayed %d state journal entries.", self._journal_entries)
+
+    def mark_dirty(self):
+        self._dirty = True
+        self._dirty_event.set()
+
+    async def save_state(self, pretty=False):
+        """Write a snapshot; compact unless pretty is set for a debug save."""
+        async with self._rw.write():
+            self._dirty = False
+            try:
+                data = json_utils.dumps(self.state, pretty=pretty)
+                # Most cycles mark the state dirty without changing it; skip the
+                # disk write when the snapshot on disk is already identical.
+                if data == self._snapshot and not self._journal_entries:
+                    return
+                await asyncio.to_thread(self._write, data)
+                self._snapshot = data
+                self._journal_entries = 0
+            except Exception as e:
+                self._dirty = True
+                logger.error(f"Failed to save state: {e}")
+
+    def _write(self, data):
+        tmp_path = f"{self.filepath}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.filepath)
+        # The snapshot now covers every journaled entry.
+        open(self.journal_path, "wb").close()
+
+    def _append_journal(self, line):
+        # Kept open between appends; O_APPEND keeps writes at the end even
+        # after _write truncates the file underneath it.
+        if self._journal is None:
+            self._journal = open(self.journal_path, "ab")
+        self._journal.write(line)
+        self._journal.flush()
+
+    async def run_flusher(self):
+        """Persist the state at most once per flush_interval while it is dirty."""
+        while True:
+            await self._dirty_event.wait()
+            self._dirty_event.clear()
+            if self._dirty:
+                await self.save_state()
+            await asyncio.sleep(self.flush_interval)
+
+    async def flush(self):
+        if self._dirty:
+            await self.save_state()
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    async def get(self, key, default=None):
+        async with self._rw.read():
+            return self.state.get(key, default)
+
+    async def set(self, key, value):
+        async with self._rw.write():
+            self.state[key] = value
+            try:
+                line = json_utils.dumps({"k": key, "v": value}) + b"\n"
+                await asyncio.to_thread(self._append_journal, line)
+                self._journal_entries += 1
+            except Exception as e:
+                logger.error("Failed to journal state key %s: %s", key, e)
+                self.mark_dirty()
+                return
+        if self._journal_entries >= self.COMPACT_AFTER:
+            self.mark_dirty()
@@ -1,16 +1,109 @@
+import asyncio
 import logging
+import time
+from collections import defaultdict, deque
 from telegram import Update
 from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes, Application
+from telegram.request import HTTPXRequest
+from config import CONFIG
 from trading_bot import TradingBot
 
 logger = logging.getLogger(__name__)
 
+try:
+    import h2  # noqa: F401  (httpx needs it for HTTP/2)
+    _HTTP_VERSION = "2"
+except ImportError:
+    _HTTP_VERSION = "1.1"
+    logger.debug("h2 not installed; Telegram requests use HTTP/1.1.")
+
+
+class RateLimitedSender:
+    """Queue outgoing messages and send at most one per interval.
+
+    Telegram allows about one message a second per chat. Messages queued for
+    the same chat while the sender waits are merged into one, up to
+    Telegram's length limit, which also saves round trips.
+    """
+
+    MAX_MESSAGE_LENGTH = 4096
+
+    def __init__(self, bot, interval=1.0):
+        self.bot = bot
+        self.interval = interval
+        self._pending = deque()
+        self._ready = asyncio.Event()
+        # Set while nothing is queued or being sent; drain() waits on it.
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._last_sent = 0.0
+
+    async def send(self, chat_id, text):
+        self._pending.append((chat_id, text))
+        self._idle.clear()
+        self._ready.set()
+
+    async def drain(self, timeout):
+        """Wait up to timeout seconds for queued messages to be sent."""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Dropping %d unsent Telegram messages.", len(self._pending))
+
+    async def run(self):
+        while True:
+            if not self._pending:
+                self._idle.set()
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            delay = self._last_sent + self.interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            chat_id, text = self._pending.popleft()
+            parts = [text]
+            size = len(text)
+            while (
+                self._pending
+                and self._pending[0][0] == chat_id
+                and size + 1 + len(self._pending[0][1]) <= self.MAX_MESSAGE_LENGTH
+            ):
+                text = self._pending.popleft()[1]
+                parts.append(text)
+                size += 1 + len(text)
+            self._last_sent = time.monotonic()
+            try:
+                await self.bot.send_message(chat_id=chat_id, text="\n".join(parts))
+            except Exception as e:
+                logger.error("Failed to send Telegram message to %s: %s", chat_id, e)
+
+
 class TelegramBot:
+    # How long shutdown waits for queued replies before dropping them.
+    DRAIN_SECONDS = 5
+
     def __init__(self, token, chat_id, trading_bot: TradingBot):
         self.token = token
         self.chat_id = chat_id
         self.trading_bot = trading_bot
-        self.app: Application = ApplicationBuilder().token(self.token).build()
+        # The default request object holds a single connection, so concurrent
+        # replies queue behind each other; keep a pool of warm connections
+        # (multiplexed over one when HTTP/2 is available). getUpdates keeps
+        # its own single connection and stretches its read timeout to the
+        # poll timeout itself.
+        request = HTTPXRequest(
+            connection_pool_size=8,
+            connect_timeout=5.0,
+            read_timeout=30.0,
+            http_version=_HTTP_VERSION,
+        )
+        self.app: Application = ApplicationBuilder().token(self.token).request(request).build()
+        self.sender = RateLimitedSender(self.app.bot)
+        # Slow commands run as background tasks so the update loop keeps
+        # polling; a lock per chat keeps one chat's commands in order.
+        self._chat_locks = defaultdict(asyncio.Lock)
+        self._tasks = set()
+        self._debounce_until = {}
 
         self.app.add_handler(CommandHandler("start", self.start))
         self.app.add_handler(CommandHandler("status", self.status))
@@ -23,10 +116,7 @@ class TelegramBot:
         if not chat or not chat.id:
             logger.warning("No chat or chat.id found in /start command")
             return
-        await context.bot.send_message(
-            chat_id=chat.id,
-            text="🤖 AI Forex Bot started. Use /status to check bot status.",
-        )
+        await self.sender.send(chat.id, "🤖 AI Forex Bot started. Use /status to check bot status.")
 
     async def status(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         chat = update.effective_chat
@@ -40,18 +130,27 @@ class TelegramBot:
         msg = (
             f"Bot running: {self.trading_bot.running}\nOpen trades: {len(open_trades)}"
         )
-        await context.bot.send_message(chat_id=chat.id, text=msg)
+        await self.sender.send(chat.id, msg)
 
     async def make_trade(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         chat = update.effective_chat
         if not chat or not chat.id:
             logger.warning("No chat or chat.id found in /maketrade command")
             return
+        # A burst of /maketrade taps should run one trade cycle, not one each.
+        now = time.monotonic()
+        if now < self._debounce_until.get(chat.id, 0.0):
+            logger.debug("Ignoring repeated /maketrade from chat %s", chat.id)
+            return
+        self._debounce_until[chat.id] = now + CONFIG.TELEGRAM_DEBOUNCE_SECONDS
+        self._spawn(chat.id, self._do_make_trade(chat.id))
+
+    async def _do_make_trade(self, chat_id):
         if not self.trading_bot.running:
-            await context.bot.send_message(chat_id=chat.id, text="Bot is not running.")
+            await self.sender.send(chat_id, "Bot is not running.")
             return
         await self.trading_bot.trade_cycle()
-        await context.bot.send_message(chat_id=chat.id, text="Trade cycle executed.")
+        await self.sender.send(chat_id, "Trade cycle executed.")
 
     async def stop(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         chat = update.effective_chat
@@ -59,29 +158,75 @@ class TelegramBot:
             logger.warning("No chat or chat.id found in /stop command")
             return
         await self.trading_bot.stop()
-        await context.bot.send_message(chat_id=chat.id, text="Bot stopped.")
+        await self.sender.send(chat.id, "Bot stopped.")
 
     async def close_all(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         chat = update.effective_chat
         if not chat or not chat.id:
             logger.warning("No chat or chat.id found in /closeall command")
             return
+        self._spawn(chat.id, self._do_close_all(chat.id))
+
+    async def _do_close_all(self, chat_id):
         open_trades = self.trading_bot.state.get("open_trades", {})
         if not isinstance(open_trades, dict):
             logger.warning(f"Invalid open_trades type in close_all: {type(open_trades)}. Resetting.")
             open_trades = {}
         trades = list(open_trades.keys())
-        for trade_id in trades:
-            try:
-                await self.trading_bot.client.close_trade(trade_id)
+        # Closes are independent requests; issue them together rather than
+        # waiting a round trip per trade.
+        results = await asyncio.gather(
+            *(self.trading_bot.client.close_trade(trade_id) for trade_id in trades),
+            return_exceptions=True,
+        )
+        for trade_id, result in zip(trades, results):
+            if isinstance(result, Exception):
+                logger.error("Error closing trade %s: %s", trade_id, result)
+            else:
                 self.trading_bot.state["open_trades"].pop(trade_id, None)
+        await self.sender.send(chat_id, "All trades closed.")
+
+    def _spawn(self, chat_id, coro):
+        task = asyncio.create_task(self._run_in_chat(chat_id, coro))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_in_chat(self, chat_id, coro):
+        async with self._chat_locks[chat_id]:
+            try:
+                await coro
             except Exception as e:
-                logger.error(f"Error closing trade {trade_id}: {e}")
-        await context.bot.send_message(chat_id=chat.id, text="All trades closed.")
+                logger.error("Command failed for chat %s: %s", chat_id, e)
 
     async def run(self):
+        """Long-poll for updates until the task is cancelled.
+
+        run_polling() owns the event loop and signal handlers, so it cannot
+        run as a task beside the trading loop; drive the updater directly.
+        getUpdates blocks server-side for TELEGRAM_POLL_TIMEOUT seconds, so
+        an idle bot makes a request every 30s and updates arrive at once.
+        """
+        sender = asyncio.create_task(self.sender.run())
         try:
-            await self.app.run_polling()
+            await self.app.initialize()
+            await self.app.start()
+            await self.app.updater.start_polling(
+                timeout=CONFIG.TELEGRAM_POLL_TIMEOUT,
+                poll_interval=0.0,
+                bootstrap_retries=-1,
+            )
+            await asyncio.Event().wait()
         except Exception as e:
             logger.error(f"❌ Telegram bot polling failed: {e}")
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            if self.app.updater.running:
+                await self.app.updater.stop()
+            # Let replies already queued (e.g. /closeall results) go out.
+            await self.sender.drain(self.DRAIN_SECONDS)
+            sender.cancel()
+            if self.app.running:
+                await self.app.stop()
+            await self.app.shutdown()
  
\ No newline at end of file
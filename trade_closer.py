@@ -1,10 +1,22 @@
 import logging
-from datetime import datetime, timedelta
-from utils import calculate_atr
+import time
+from datetime import datetime, timezone
+from utils import cached_atr, pip_size
 from config import CONFIG
 
 logger = logging.getLogger(__name__)
 
+MAX_TRADE_SECONDS = 4 * 3600
+
+
+def _epoch(iso_time):
+    """POSIX timestamp of an ISO time; naive values are taken as UTC."""
+    moment = datetime.fromisoformat(iso_time)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
 class TradeCloser:
     def __init__(self, state, client):
         self.state = state
@@ -13,31 +25,23 @@ class TradeCloser:
     async def should_close_trade(self, trade_id, trade_info):
         try:
             instrument = trade_info.get("instrument", CONFIG.INSTRUMENT)
-            raw_candles = await self.client.get_candles(
+            # One parsed buffer feeds both the ATR and the current price.
+            candles = await self.client.get_candle_buffer(
                 instrument, CONFIG.CANDLE_GRANULARITY, CONFIG.CANDLE_COUNT
             )
-            candles = (
-                raw_candles.get("candles")
-                if isinstance(raw_candles, dict)
-                else raw_candles
-            )
-            if not candles:
-                logger.warning(f"No candles data for trade closer on {instrument}")
+            if not len(candles):
+                logger.warning("No candles data for trade closer on %s", instrument)
                 return False
 
-            atr = calculate_atr(candles, period=14)
+            atr = cached_atr(instrument, candles)
             if atr == 0:
-                atr = 0.0005
+                atr = CONFIG.MIN_ATR_PIPS * pip_size(instrument)
 
-            current_price = (
-                float(candles[-1]["mid"]["c"])
-                if "mid" in candles[-1]
-                else float(candles[-1]["close"])
-            )
+            current_price = float(candles.closes[-1])
 
             entry_price = trade_info.get("entry_price")
             if entry_price is None:
-                logger.warning(f"No entry price for trade {trade_id}, skipping close check.")
+                logger.warning("No entry price for trade %s, skipping close check.", trade_id)
                 return False
 
             stop_distance = atr * 3
@@ -50,7 +54,7 @@ class TradeCloser:
                 )
                 trade_info["trailing_stop"] = trailing_stop
                 if current_price <= trailing_stop:
-                    logger.info(f"Trailing stop hit for trade {trade_id}, closing trade.")
+                    logger.info("Trailing stop hit for trade %s, closing trade.", trade_id)
                     return True
             elif side == "SELL":
                 trailing_stop = min(
@@ -59,18 +63,20 @@ class TradeCloser:
                 )
                 trade_info["trailing_stop"] = trailing_stop
                 if current_price >= trailing_stop:
-                    logger.info(f"Trailing stop hit for trade {trade_id}, closing trade.")
+                    logger.info("Trailing stop hit for trade %s, closing trade.", trade_id)
                     return True
 
-            opened_at = trade_info.get("opened_at")
-            if opened_at:
-                open_time = datetime.fromisoformat(opened_at)
-                if datetime.utcnow() - open_time > timedelta(hours=4):
-                    logger.info(f"Trade {trade_id} open over 4 hours, closing.")
-                    return True
+            # The ISO opened_at is parsed once; the resulting epoch deadline is
+            # stored on the trade so later checks are a float comparison.
+            close_by = trade_info.get("close_by")
+            if close_by is None and trade_info.get("opened_at"):
+                close_by = _epoch(trade_info["opened_at"]) + MAX_TRADE_SECONDS
+                trade_info["close_by"] = close_by
+            if close_by is not None and time.time() > close_by:
+                logger.info("Trade %s open over 4 hours, closing.", trade_id)
+                return True
 
             return False
         except Exception as e:
-            logger.error(f"Error in should_close_trade for {trade_id}: {e}")
+            logger.error("Error in should_close_trade for %s: %s", trade_id, e)
             return False
- 
\ No newline at end of file
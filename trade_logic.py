@@ -1,44 +1,91 @@
+import asyncio
 import logging
-from utils import calculate_rsi, calculate_macd
+from utils import SIGNAL_LUT, IndicatorState, signal_mask
 from config import CONFIG
 
 logger = logging.getLogger(__name__)
 
+# Thresholds are fixed for the process lifetime; bind them once at import.
+_RSI_OVERSOLD = CONFIG.RSI_OVERSOLD
+_RSI_OVERBOUGHT = CONFIG.RSI_OVERBOUGHT
+
 
 class TradeLogic:
     def __init__(self, state, client):
         self.state = state
         self.client = client
+        self._indicators = None
+        self._last_bar_time = None
+        # /maketrade can run a cycle alongside the trading loop; both would
+        # fetch from the same _last_bar_time and fold the same bars twice.
+        self._lock = asyncio.Lock()
 
     async def generate_signal(self):
-        candles_response = await self.client.get_candles(
-            CONFIG.INSTRUMENT, CONFIG.CANDLE_GRANULARITY, CONFIG.CANDLE_COUNT
-        )
-        candles = candles_response.get("candles", []) if isinstance(candles_response, dict) else []
+        async with self._lock:
+            return await self._generate_signal()
 
-        if len(candles) < 30:
-            logger.warning("Not enough candle data to generate signal.")
+    async def _generate_signal(self):
+        candles = await self._fetch_new_candles()
+        if candles is None:
             return None
 
-        rsi_values = calculate_rsi(candles, period=14)
-        macd, signal_line = calculate_macd(candles, fast=12, slow=26, signal=9)
+        # Fold only completed bars into the running state; the still-forming
+        # bar is evaluated on top of it without being committed.
+        completed = candles.complete
+        if completed.any():
+            self._indicators.seed(candles.closes[completed])
+            last_time = candles.times[completed][-1]
+            if last_time:
+                self._last_bar_time = last_time
 
-        if not rsi_values or not macd or not signal_line:
+        if len(candles) and not completed[-1]:
+            current_rsi, current_macd, current_signal = self._indicators.peek(candles.closes[-1])
+        elif self._indicators.last_close is not None:
+            current_rsi, current_macd, current_signal = self._indicators.current()
+        else:
             logger.warning("Indicators not available for signal generation.")
             return None
 
-        current_rsi = rsi_values[-1]
-        current_macd = macd[-1]
-        current_signal = signal_line[-1]
-
-        # Simple RSI + MACD strategy for trade signals:
-        if current_rsi < CONFIG.RSI_OVERSOLD and current_macd > current_signal:
-            logger.info("TradeLogic generated BUY signal.")
-            return "BUY"
-        elif current_rsi > CONFIG.RSI_OVERBOUGHT and current_macd < current_signal:
-            logger.info("TradeLogic generated SELL signal.")
-            return "SELL"
+        # Simple RSI + MACD strategy: BUY when oversold with MACD above its
+        # signal line, SELL when overbought with MACD below it.
+        signal = SIGNAL_LUT[signal_mask(
+            current_rsi, current_macd, current_signal, _RSI_OVERSOLD, _RSI_OVERBOUGHT
+        )]
+        if signal is not None:
+            logger.info("TradeLogic generated %s signal.", signal)
+            return signal
 
         logger.debug("TradeLogic found no trade signal.")
         return None
- 
\ No newline at end of file
+
+    async def _fetch_new_candles(self):
+        """Return candles not yet folded into the indicator state.
+
+        The first call bootstraps from CANDLE_COUNT bars; afterwards only
+        bars from the last completed one onwards are requested.
+        """
+        if self._indicators is None or self._last_bar_time is None:
+            return await self._bootstrap()
+
+        candles = await self.client.get_candle_buffer(
+            CONFIG.INSTRUMENT,
+            CONFIG.CANDLE_GRANULARITY,
+            CONFIG.CANDLE_COUNT,
+            from_time=self._last_bar_time,
+        )
+        if len(candles) >= CONFIG.CANDLE_COUNT and candles.complete[-1]:
+            # A full batch with no forming bar means more bars passed than one
+            # request returns; the indicators would lag behind the market.
+            logger.info("Missed more than %d bars; re-seeding indicators.", CONFIG.CANDLE_COUNT)
+            return await self._bootstrap()
+        return candles.select(candles.times > self._last_bar_time)
+
+    async def _bootstrap(self):
+        candles = await self.client.get_candle_buffer(
+            CONFIG.INSTRUMENT, CONFIG.CANDLE_GRANULARITY, CONFIG.CANDLE_COUNT
+        )
+        if len(candles) < 30:
+            logger.warning("Not enough candle data to generate signal.")
+            return None
+        self._indicators = IndicatorState(rsi_period=14, fast=12, slow=26, signal=9)
+        return candles
@@ -33,9 +33,9 @@ class TradingBot:
         if signal in ("BUY", "SELL"):
             success = await self.trade_executor.execute_trade(signal)
             if success:
-                logger.info(f"✅ Trade executed: {signal}")
+                logger.info("✅ Trade executed: %s", signal)
         else:
             closed_trades = await self.trade_executor.monitor_trades()
             if closed_trades:
-                logger.info(f"📉 Closed trades: {closed_trades}")
+                logger.info("📉 Closed trades: %s", closed_trades)
  
\ No newline at end of file
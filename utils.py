@@ -1,82 +1,341 @@
 import logging
+from collections import OrderedDict, deque
+import numpy as np
+from _njit import njit
+from candles import CandleBuffer
+
+try:
+    from xxhash import xxh3_64_intdigest as _digest
+except ImportError:
+    _digest = hash
 
 logger = logging.getLogger(__name__)
 
 
+def array_digest(*arrays):
+    """Content hash of one or more arrays, for keying caches of indicator results."""
+    return _digest(b"".join(np.ascontiguousarray(a).tobytes() for a in arrays))
+
+
+# Pip sizes for the pairs this bot trades; anything else falls back to the
+# JPY-quote rule in pip_size.
+PIP_SIZES = {
+    "EUR_USD": 0.0001,
+    "GBP_USD": 0.0001,
+    "AUD_USD": 0.0001,
+    "NZD_USD": 0.0001,
+    "USD_CHF": 0.0001,
+    "USD_CAD": 0.0001,
+    "EUR_GBP": 0.0001,
+    "USD_JPY": 0.01,
+    "EUR_JPY": 0.01,
+    "GBP_JPY": 0.01,
+}
+
+
+_pip_sizes = dict(PIP_SIZES)
+
+
+def pip_size(instrument):
+    size = _pip_sizes.get(instrument)
+    if size is None:
+        # Resolved once per unlisted instrument, then served from the table.
+        size = 0.01 if instrument.endswith("JPY") else 0.0001
+        _pip_sizes[instrument] = size
+    return size
+
+
+def candle_closes(candles):
+    """Close prices as a float64 array; accepts OANDA mid candles or flat dicts."""
+    return np.fromiter(
+        (float(c["mid"]["c"]) if "mid" in c else float(c["close"]) for c in candles),
+        dtype=np.float64,
+        count=len(candles),
+    )
+
+
+# Full-series kernels for calculate_rsi/calculate_macd. Nothing on the trade
+# path calls them any more (TradeLogic runs IndicatorState), so they compile
+# lazily on first use instead of at import.
+@njit(cache=True, fastmath=True)
+def _rsi_loop(closes, period):
+    n = closes.shape[0]
+    out = np.full(n, 50.0)
+    gain_sum = 0.0
+    loss_sum = 0.0
+    # Count of losing deltas in the window, so a window with no losses is
+    # detected exactly instead of via a rounding-prone running sum.
+    loss_count = 0
+    for i in range(1, n):
+        delta = closes[i] - closes[i - 1]
+        if delta > 0:
+            gain_sum += delta
+        elif delta < 0:
+            loss_sum -= delta
+            loss_count += 1
+        if i > period:
+            old = closes[i - period] - closes[i - period - 1]
+            if old > 0:
+                gain_sum -= old
+            elif old < 0:
+                loss_sum += old
+                loss_count -= 1
+        if i >= period:
+            if loss_count == 0:
+                out[i] = 100.0
+            else:
+                rs = gain_sum / loss_sum
+                out[i] = 100.0 - 100.0 / (1.0 + rs)
+    return out
+
+
+@njit(cache=True, fastmath=True)
+def _macd_loop(closes, fast, slow, signal):
+    # The fast/slow EMAs are carried as scalars; only the two outputs are stored.
+    alpha_fast = 2.0 / (fast + 1)
+    alpha_slow = 2.0 / (slow + 1)
+    alpha_signal = 2.0 / (signal + 1)
+    n = closes.shape[0]
+    macd = np.empty(n)
+    signal_line = np.empty(n)
+    ema_fast = closes[0]
+    ema_slow = closes[0]
+    macd[0] = 0.0
+    signal_line[0] = 0.0
+    for i in range(1, n):
+        ema_fast = (closes[i] - ema_fast) * alpha_fast + ema_fast
+        ema_slow = (closes[i] - ema_slow) * alpha_slow + ema_slow
+        macd[i] = ema_fast - ema_slow
+        signal_line[i] = (macd[i] - signal_line[i - 1]) * alpha_signal + signal_line[i - 1]
+    return macd, signal_line
+
+
+# The signature makes numba compile this eagerly at import (and load it from
+# its on-disk cache afterwards) rather than on the first trade cycle.
+@njit(
+    "Tuple((float64, float64, int64, float64, float64, float64))"
+    "(float64[::1], int64, float64, float64, float64)",
+    cache=True,
+    fastmath=True,
+)
+def _indicator_state_loop(closes, period, alpha_fast, alpha_slow, alpha_signal):
+    """Single pass over closes returning only the final RSI/MACD running state."""
+    gain_sum = 0.0
+    loss_sum = 0.0
+    loss_count = 0
+    ema_fast = closes[0]
+    ema_slow = closes[0]
+    ema_signal = 0.0
+    for i in range(1, closes.shape[0]):
+        delta = closes[i] - closes[i - 1]
+        if delta > 0:
+            gain_sum += delta
+        elif delta < 0:
+            loss_sum -= delta
+            loss_count += 1
+        if i > period:
+            old = closes[i - period] - closes[i - period - 1]
+            if old > 0:
+                gain_sum -= old
+            elif old < 0:
+                loss_sum += old
+                loss_count -= 1
+        ema_fast = (closes[i] - ema_fast) * alpha_fast + ema_fast
+        ema_slow = (closes[i] - ema_slow) * alpha_slow + ema_slow
+        ema_signal = (ema_fast - ema_slow - ema_signal) * alpha_signal + ema_signal
+    return gain_sum, loss_sum, loss_count, ema_fast, ema_slow, ema_signal
+
+
+# RSI/MACD decision packed into 4 bits:
+#   bit 0: rsi < oversold    bit 1: macd > signal
+#   bit 2: rsi > overbought  bit 3: macd < signal
+SIGNAL_LUT = tuple(
+    "BUY" if m & 0b0011 == 0b0011 else "SELL" if m & 0b1100 == 0b1100 else None
+    for m in range(16)
+)
+
+
+def signal_mask(rsi, macd, signal, oversold, overbought):
+    return (
+        (rsi < oversold)
+        | (macd > signal) << 1
+        | (rsi > overbought) << 2
+        | (macd < signal) << 3
+    )
+
+
+def true_range(highs, lows, closes):
+    """True range of bars 1..n-1, computed with elementwise maxima (no per-bar branching)."""
+    prev_closes = closes[:-1]
+    highs = highs[1:]
+    lows = lows[1:]
+    # Three buffers, reused in place via out=, instead of a temporary per op.
+    tr = np.subtract(highs, lows)
+    up = np.subtract(highs, prev_closes)
+    np.abs(up, out=up)
+    down = np.subtract(lows, prev_closes)
+    np.abs(down, out=down)
+    np.maximum(up, down, out=up)
+    return np.maximum(tr, up, out=tr)
+
+
 def calculate_atr(candles, period=14):
+    """ATR over the last `period` bars; accepts a CandleBuffer or a list of candles."""
     try:
-        highs = [float(c["high"]) for c in candles]
-        lows = [float(c["low"]) for c in candles]
-        closes = [float(c["close"]) for c in candles]
-
-        trs = []
-        for i in range(1, len(candles)):
-            tr = max(
-                highs[i] - lows[i],
-                abs(highs[i] - closes[i - 1]),
-                abs(lows[i] - closes[i - 1])
-            )
-            trs.append(tr)
-
-        atr = sum(trs[-period:]) / period if len(trs) >= period else sum(trs) / len(trs)
-        return atr
+        if not isinstance(candles, CandleBuffer):
+            candles = CandleBuffer.from_candles(candles)
+        if len(candles) < 2:
+            return 0.0
+        # Only the last `period` true ranges are averaged, so only the bars
+        # feeding them (plus one previous close) are touched.
+        window = slice(-(period + 1), None)
+        tr = true_range(candles.highs[window], candles.lows[window], candles.closes[window])
+        return float(tr.mean())
     except Exception as e:
         logger.error(f"Failed to calculate ATR: {e}")
         return 0.0
 
 
-def calculate_rsi(candles, period=14):
+_ATR_CACHE_SIZE = 64
+_atr_cache = OrderedDict()
+
+
+def cached_atr(instrument, candles, period=14):
+    """calculate_atr for a CandleBuffer, memoized across callers.
+
+    Keyed by the window's contents, so identical candles never recompute
+    and any change to them (including the forming bar) misses.
+    """
+    key = (instrument, period, array_digest(candles.highs, candles.lows, candles.closes))
+    atr = _atr_cache.get(key)
+    if atr is not None:
+        _atr_cache.move_to_end(key)
+        return atr
+
+    atr = calculate_atr(candles, period)
+    _atr_cache[key] = atr
+    if len(_atr_cache) > _ATR_CACHE_SIZE:
+        _atr_cache.popitem(last=False)
+    return atr
+
+
+def calculate_rsi(closes, period=14):
     try:
-        closes = [float(c["close"]) for c in candles]
+        closes = np.ascontiguousarray(closes, dtype=np.float64)
         if len(closes) < period + 1:
-            return [50] * len(closes)
-
-        rsi_values = []
-        for i in range(period, len(closes)):
-            gains = []
-            losses = []
-            for j in range(i - period, i):
-                delta = closes[j + 1] - closes[j]
-                if delta > 0:
-                    gains.append(delta)
-                    losses.append(0)
-                else:
-                    gains.append(0)
-                    losses.append(-delta)
-            avg_gain = sum(gains) / period
-            avg_loss = sum(losses) / period
-            rs = avg_gain / avg_loss if avg_loss != 0 else 0
-            rsi = 100 - (100 / (1 + rs)) if avg_loss != 0 else 100
-            rsi_values.append(round(rsi, 2))
-
-        return [50] * (len(closes) - len(rsi_values)) + rsi_values
+            return np.full(len(closes), 50.0)
+        return np.round(_rsi_loop(closes, period), 2)
     except Exception as e:
         logger.error(f"Failed to calculate RSI: {e}")
-        return [50] * len(candles)
+        return np.full(len(closes), 50.0)
 
 
-def calculate_macd(candles, fast=12, slow=26, signal=9):
+def calculate_macd(closes, fast=12, slow=26, signal=9):
     try:
-        closes = [float(c["close"]) for c in candles]
+        closes = np.ascontiguousarray(closes, dtype=np.float64)
+        if len(closes) < slow:
+            return np.zeros(len(closes)), np.zeros(len(closes))
+        return _macd_loop(closes, fast, slow, signal)
+    except Exception as e:
+        logger.error(f"Failed to calculate MACD: {e}")
+        return np.zeros(len(closes)), np.zeros(len(closes))
 
-        def ema(data, span):
-            alpha = 2 / (span + 1)
-            result = [data[0]]
-            for price in data[1:]:
-                result.append((price - result[-1]) * alpha + result[-1])
-            return result
 
-        if len(closes) < slow:
-            return [0] * len(closes), [0] * len(closes)
+class IndicatorState:
+    """Running RSI/MACD state, advanced one close at a time.
 
-        ema_fast = ema(closes, fast)
-        ema_slow = ema(closes, slow)
-        macd = [f - s for f, s in zip(ema_fast[-len(ema_slow):], ema_slow)]
-        signal_line = ema(macd, signal)
-        macd = macd[-len(signal_line):]
+    Produces the same values as calculate_rsi/calculate_macd over the full
+    history, without revisiting closes that were already folded in.
+    """
 
-        return macd, signal_line
-    except Exception as e:
-        logger.error(f"Failed to calculate MACD: {e}")
-        return [0] * len(candles), [0] * len(candles)
- 
\ No newline at end of file
+    __slots__ = (
+        "rsi_period", "alpha_fast", "alpha_slow", "alpha_signal", "deltas",
+        "gain_sum", "loss_sum", "loss_count", "last_close",
+        "ema_fast", "ema_slow", "ema_signal",
+    )
+
+    def __init__(self, rsi_period=14, fast=12, slow=26, signal=9):
+        self.rsi_period = rsi_period
+        self.alpha_fast = 2 / (fast + 1)
+        self.alpha_slow = 2 / (slow + 1)
+        self.alpha_signal = 2 / (signal + 1)
+        self.deltas = deque(maxlen=rsi_period)
+        self.gain_sum = 0.0
+        self.loss_sum = 0.0
+        self.loss_count = 0
+        self.last_close = None
+        self.ema_fast = None
+        self.ema_slow = None
+        self.ema_signal = None
+
+    def seed(self, closes):
+        if self.last_close is not None or len(closes) < 2:
+            for close in closes:
+                self.update(close)
+            return
+
+        # Fresh state: fold the whole history in one compiled pass.
+        closes = np.ascontiguousarray(closes, dtype=np.float64)
+        (self.gain_sum, self.loss_sum, self.loss_count,
+         self.ema_fast, self.ema_slow, self.ema_signal) = _indicator_state_loop(
+            closes, self.rsi_period, self.alpha_fast, self.alpha_slow, self.alpha_signal
+        )
+        self.deltas.extend(np.diff(closes[-(self.rsi_period + 1):]).tolist())
+        self.last_close = float(closes[-1])
+
+    def update(self, close):
+        """Fold a completed bar's close into the state and return (rsi, macd, signal)."""
+        step = self._step(close)
+        (self.gain_sum, self.loss_sum, self.loss_count,
+         self.ema_fast, self.ema_slow, self.ema_signal, delta) = step
+        if delta is not None:
+            self.deltas.append(delta)
+        self.last_close = close
+        # The delta is in self.deltas now; current() must not count it again.
+        return self.current()
+
+    def current(self):
+        """Indicator values as of the last folded close."""
+        return self._values(
+            (self.gain_sum, self.loss_sum, self.loss_count,
+             self.ema_fast, self.ema_slow, self.ema_signal, None)
+        )
+
+    def peek(self, close):
+        """Indicator values if `close` were the next bar, without mutating state."""
+        return self._values(self._step(close))
+
+    def _step(self, close):
+        if self.last_close is None:
+            return 0.0, 0.0, 0, close, close, 0.0, None
+
+        delta = close - self.last_close
+        gain_sum, loss_sum, loss_count = self.gain_sum, self.loss_sum, self.loss_count
+        if delta > 0:
+            gain_sum += delta
+        elif delta < 0:
+            loss_sum -= delta
+            loss_count += 1
+        if len(self.deltas) == self.rsi_period:
+            old = self.deltas[0]
+            if old > 0:
+                gain_sum -= old
+            elif old < 0:
+                loss_sum += old
+                loss_count -= 1
+
+        ema_fast = (close - self.ema_fast) * self.alpha_fast + self.ema_fast
+        ema_slow = (close - self.ema_slow) * self.alpha_slow + self.ema_slow
+        macd = ema_fast - ema_slow
+        ema_signal = (macd - self.ema_signal) * self.alpha_signal + self.ema_signal
+        return gain_sum, loss_sum, loss_count, ema_fast, ema_slow, ema_signal, delta
+
+    def _values(self, step):
+        gain_sum, loss_sum, loss_count, ema_fast, ema_slow, ema_signal, delta = step
+        if len(self.deltas) + (delta is not None) < self.rsi_period:
+            rsi = 50.0
+        elif loss_count == 0:
+            rsi = 100.0
+        else:
+            rsi = round(100 - 100 / (1 + gain_sum / loss_sum), 2)
+        return rsi, ema_fast - ema_slow, ema_signal